@@ -9,5 +9,14 @@ class PatientEmailPluginConfig(PluginAppConfig):
     def ready(self):
         """Called when the app is ready."""
         super().ready()
-        # Import the model extensions to register them
-        # Import template hooks to register them
+
+        # ready() can run more than once (e.g. under the autoreloader)
+        if getattr(self, "_registered", False):
+            return
+        self._registered = True
+
+        from .model_extensions import extend_patient_model
+        from .template_hooks import register_template_hooks
+
+        extend_patient_model()
+        register_template_hooks()
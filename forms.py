@@ -38,22 +38,25 @@ class PatientEmailForm(forms.ModelForm):
         email = cleaned_data.get("email")
         secondary_email = cleaned_data.get("secondary_email")
         preferred_email = cleaned_data.get("preferred_email")
+        notifications_enabled = cleaned_data.get("email_notifications_enabled")
 
         # Ensure at least one email is provided if notifications are enabled
-        if cleaned_data.get("email_notifications_enabled"):
-            if not email and not secondary_email:
-                raise forms.ValidationError(
-                    "At least one email address is required when email notifications are enabled."
-                )
+        if notifications_enabled and not (email or secondary_email):
+            self.add_error(
+                "email",
+                "At least one email address is required when email notifications are enabled.",
+            )
+            return cleaned_data
 
         # Ensure preferred email exists
         if preferred_email == "secondary" and not secondary_email:
-            raise forms.ValidationError(
-                "Secondary email address is required when it's set as preferred."
+            self.add_error(
+                "secondary_email",
+                "Secondary email address is required when it's set as preferred.",
             )
         elif preferred_email == "primary" and not email:
-            raise forms.ValidationError(
-                "Primary email address is required when it's set as preferred."
+            self.add_error(
+                "email", "Primary email address is required when it's set as preferred."
             )
 
         return cleaned_data
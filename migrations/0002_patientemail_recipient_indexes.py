@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-15 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patient_email_plugin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="patientemail",
+            index=models.Index(
+                fields=["email_notifications_enabled", "email_bounced"],
+                name="pep_notif_bounce",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientemail",
+            index=models.Index(
+                condition=models.Q(("email_bounced", False)),
+                fields=["organization", "email_notifications_enabled"],
+                name="pep_org_notif",
+            ),
+        ),
+    ]
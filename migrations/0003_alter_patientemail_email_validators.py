@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-15 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patient_email_plugin", "0002_patientemail_recipient_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="patientemail",
+            name="email",
+            field=models.EmailField(
+                blank=True,
+                help_text="Patient's primary email address",
+                max_length=254,
+                null=True,
+                verbose_name="Email Address",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="patientemail",
+            name="secondary_email",
+            field=models.EmailField(
+                blank=True,
+                help_text="Patient's secondary email address (optional)",
+                max_length=254,
+                null=True,
+                verbose_name="Secondary Email",
+            ),
+        ),
+    ]
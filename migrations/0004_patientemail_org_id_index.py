@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-15 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("patient_email_plugin", "0003_alter_patientemail_email_validators"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="patientemail",
+            index=models.Index(fields=["organization", "-id"], name="pep_org_id"),
+        ),
+    ]
@@ -4,9 +4,12 @@ Patient Model Extensions
 This module extends the Patient model with email functionality using monkey patching.
 This allows adding methods to the Patient model without modifying the original model file.
 """
+import logging
 
 from patients.models.people import Patient
 
+logger = logging.getLogger(__name__)
+
 
 def get_email_profile(self):
     """
@@ -15,12 +18,15 @@ def get_email_profile(self):
     Returns:
         PatientEmail: The email profile for this patient
     """
-    from .models import PatientEmail
+    from .models import PatientEmail, email_profile_is_loaded
 
-    email_profile, created = PatientEmail.objects.get_or_create(
-        patient=self, defaults={"organization": self.organization}
-    )
-    return email_profile
+    # Reuse the profile if it was loaded with the patient
+    if email_profile_is_loaded(self):
+        email_profile = getattr(self, "email_profile", None)
+        if email_profile is not None:
+            return email_profile
+
+    return PatientEmail.get_or_create_fast(self.pk, self.organization_id)
 
 
 def send_email(
@@ -31,6 +37,7 @@ def send_email(
     template_name=None,
     context=None,
     from_email=None,
+    fail_silently=True,
 ):
     """
     Send an email to this patient using their email profile.
@@ -44,6 +51,7 @@ def send_email(
         template_name (str): Template name to render (optional)
         context (dict): Template context (optional)
         from_email (str): Sender email (optional)
+        fail_silently (bool): Return False on errors instead of raising
 
     Returns:
         bool: True if email was sent successfully, False otherwise
@@ -70,6 +78,7 @@ def send_email(
         template_name=template_name,
         context=context,
         from_email=from_email,
+        fail_silently=fail_silently,
     )
 
 
@@ -80,11 +89,9 @@ def has_email(self):
     Returns:
         bool: True if patient has an email address, False otherwise
     """
-    try:
-        email_profile = self.email_profile
-        return bool(email_profile.get_preferred_email())
-    except Exception:
-        return False
+    # The reverse accessor caches the profile (or its absence) on the patient
+    email_profile = getattr(self, "email_profile", None)
+    return bool(email_profile and email_profile.get_preferred_email())
 
 
 def get_email(self):
@@ -94,60 +101,69 @@ def get_email(self):
     Returns:
         str: Email address or None if not available
     """
-    try:
-        email_profile = self.email_profile
-        return email_profile.get_preferred_email()
-    except Exception:
-        return None
+    email_profile = getattr(self, "email_profile", None)
+    return email_profile.get_preferred_email() if email_profile else None
 
 
-def send_appointment_reminder(self, appointment_date, appointment_time=None):
+def send_appointment_reminder(
+    self, appointment_date, appointment_time=None, fail_silently=True
+):
     """
     Send appointment reminder email to this patient.
 
     Args:
         appointment_date: The appointment date
         appointment_time: The appointment time (optional)
+        fail_silently (bool): Return False on errors instead of raising
 
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
     email_profile = self.get_email_profile()
-    return email_profile.send_appointment_reminder(appointment_date, appointment_time)
+    return email_profile.send_appointment_reminder(
+        appointment_date, appointment_time, fail_silently=fail_silently
+    )
 
 
-def send_welcome_email(self):
+def send_welcome_email(self, fail_silently=True):
     """
     Send welcome email to this patient.
 
+    Args:
+        fail_silently (bool): Return False on errors instead of raising
+
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
     email_profile = self.get_email_profile()
-    return email_profile.send_welcome_email()
+    return email_profile.send_welcome_email(fail_silently=fail_silently)
 
 
-def send_care_plan_update(self, care_plan_details):
+def send_care_plan_update(self, care_plan_details, fail_silently=True):
     """
     Send care plan update notification to this patient.
 
     Args:
         care_plan_details: Details about the care plan update
+        fail_silently (bool): Return False on errors instead of raising
 
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
     email_profile = self.get_email_profile()
-    return email_profile.send_care_plan_update(care_plan_details)
+    return email_profile.send_care_plan_update(
+        care_plan_details, fail_silently=fail_silently
+    )
 
 
-# Add methods to the Patient model
-Patient.add_to_class("get_email_profile", get_email_profile)
-Patient.add_to_class("send_email", send_email)
-Patient.add_to_class("has_email", has_email)
-Patient.add_to_class("get_email", get_email)
-Patient.add_to_class("send_appointment_reminder", send_appointment_reminder)
-Patient.add_to_class("send_welcome_email", send_welcome_email)
-Patient.add_to_class("send_care_plan_update", send_care_plan_update)
+def extend_patient_model():
+    """Add the email methods to the Patient model."""
+    Patient.add_to_class("get_email_profile", get_email_profile)
+    Patient.add_to_class("send_email", send_email)
+    Patient.add_to_class("has_email", has_email)
+    Patient.add_to_class("get_email", get_email)
+    Patient.add_to_class("send_appointment_reminder", send_appointment_reminder)
+    Patient.add_to_class("send_welcome_email", send_welcome_email)
+    Patient.add_to_class("send_care_plan_update", send_care_plan_update)
 
-print("📧 Patient model extended with email functionality")
+    logger.debug("Patient model extended with email functionality")
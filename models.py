@@ -4,15 +4,50 @@ Patient Email Plugin Models
 Creates a related model to extend Patient functionality with email.
 This approach allows extending the Patient model without modifying the original model file.
 """
-from django.core.mail import send_mail
-from django.core.validators import EmailValidator
-from django.db import models
-from django.template.loader import render_to_string
+import logging
+from functools import lru_cache
+
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
+from django.db import IntegrityError, connection, models, transaction
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.utils import timezone
 from django.utils.html import strip_tags
 
 from core.models.utils import RitikoModel
 from patients.models.people import Patient
 
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=128)
+def compile_template_source(source):
+    """Parse template source once and reuse the Template for identical sources."""
+    return Template(source)
+
+
+@lru_cache(maxsize=128)
+def compile_text_template_source(html_source):
+    """Build the plain text Template for HTML template source once per source."""
+    return Template(strip_tags(html_source))
+
+
+def email_profile_is_loaded(patient):
+    """
+    Check whether the patient's email profile was already loaded.
+
+    True after select_related("email_profile") or prefetch_related("email_profile"),
+    in which case getattr(patient, "email_profile", None) doesn't query.
+    """
+    return Patient.email_profile.related.is_cached(patient)
+
+
+class PatientEmailManager(models.Manager):
+    """Manager that joins the patient and organization by default."""
+
+    def get_queryset(self):
+        return super().get_queryset().select_related("patient", "organization")
+
 
 class PatientEmail(RitikoModel):
     """
@@ -34,7 +69,6 @@ class PatientEmail(RitikoModel):
         help_text="Patient's primary email address",
         blank=True,
         null=True,
-        validators=[EmailValidator()],
     )
 
     secondary_email = models.EmailField(
@@ -42,7 +76,6 @@ class PatientEmail(RitikoModel):
         help_text="Patient's secondary email address (optional)",
         blank=True,
         null=True,
-        validators=[EmailValidator()],
     )
 
     email_verified = models.BooleanField(
@@ -71,20 +104,159 @@ class PatientEmail(RitikoModel):
         null=True, blank=True, help_text="When the last email was sent to this patient"
     )
 
+    objects = PatientEmailManager()
+
     class Meta:
         db_table = "patient_email_profiles"
         verbose_name = "Patient Email Profile"
         verbose_name_plural = "Patient Email Profiles"
+        indexes = [
+            models.Index(
+                fields=["email_notifications_enabled", "email_bounced"],
+                name="pep_notif_bounce",
+            ),
+            # Bulk sends only target unbounced profiles. Django skips this
+            # partial index entirely on backends without partial index support
+            # (e.g. MySQL), so don't count on it existing there.
+            models.Index(
+                fields=["organization", "email_notifications_enabled"],
+                condition=models.Q(email_bounced=False),
+                name="pep_org_notif",
+            ),
+            # Keyset pagination of the list view (newest first, per organization)
+            models.Index(fields=["organization", "-id"], name="pep_org_id"),
+        ]
 
     def __str__(self):
         return f"{self.patient.get_full_name()} - {self.get_preferred_email()}"
 
+    @classmethod
+    def get_or_create_fast(cls, patient_id, organization_id):
+        """
+        Get a patient's email profile, creating it if it doesn't exist.
+
+        The common case is a single SELECT. Creation relies on the unique
+        patient column; if a concurrent request created the profile first,
+        the existing row is returned.
+
+        Args:
+            patient_id (int): Patient primary key
+            organization_id (int): Organization for a newly created profile
+
+        Returns:
+            PatientEmail: The patient's email profile
+        """
+        email_profile = cls.objects.filter(patient_id=patient_id).first()
+        if email_profile is not None:
+            return email_profile
+
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    patient_id=patient_id, organization_id=organization_id
+                )
+        except IntegrityError:
+            return cls.objects.get(patient_id=patient_id)
+
+    @classmethod
+    def annotate_has_email(cls, patients=None):
+        """
+        Annotate patients with whether they have an email address configured.
+
+        The check runs as an EXISTS subquery, so filtering on it (e.g. for
+        patients without an email) is a single query.
+
+        Args:
+            patients (QuerySet): Patient queryset to annotate (defaults to all)
+
+        Returns:
+            QuerySet: Patients annotated with a boolean ``has_email_address``
+
+        Usage:
+            PatientEmail.annotate_has_email().filter(has_email_address=False)
+        """
+        if patients is None:
+            patients = Patient.objects.all()
+
+        email_profiles = cls.objects.filter(
+            models.Q(email__gt="") | models.Q(secondary_email__gt=""),
+            patient=models.OuterRef("pk"),
+        )
+        return patients.annotate(has_email_address=models.Exists(email_profiles))
+
+    @classmethod
+    def filter_valid_recipients(cls, emails, organization):
+        """
+        Filter email addresses down to those that can receive emails.
+
+        The organization's valid addresses are loaded once into a set, so each
+        address is checked in constant time regardless of how many profiles
+        exist.
+
+        Args:
+            emails (iterable): Email addresses to filter
+            organization: Organization whose email profiles are considered
+
+        Returns:
+            list: Addresses belonging to the organization's profiles with
+            notifications enabled that have not bounced (compared
+            case-insensitively)
+        """
+        valid_emails = set()
+        rows = cls.objects.filter(
+            organization=organization,
+            email_notifications_enabled=True,
+            email_bounced=False,
+        ).values_list("email", "secondary_email")
+        for email, secondary_email in rows:
+            if email:
+                valid_emails.add(email.lower())
+            if secondary_email:
+                valid_emails.add(secondary_email.lower())
+
+        return [email for email in emails if email and email.lower() in valid_emails]
+
+    @classmethod
+    def load_bounced_set(cls, organization):
+        """
+        Load the addresses of the organization's bounced email profiles.
+
+        Uses a single raw query so large blocklists don't pay for building a
+        model instance per row.
+
+        Args:
+            organization: Organization whose email profiles are considered
+
+        Returns:
+            frozenset: Lowercased primary and secondary addresses of bounced profiles
+        """
+        quote_name = connection.ops.quote_name
+        table = quote_name(cls._meta.db_table)
+        organization_column = quote_name(cls._meta.get_field("organization").column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT email, secondary_email FROM {table} "
+                f"WHERE {organization_column} = %s AND email_bounced = %s",
+                [organization.pk, True],
+            )
+            rows = cursor.fetchall()
+
+        return frozenset(address.lower() for row in rows for address in row if address)
+
     def get_preferred_email(self):
         """Get the preferred email address for this patient."""
         if self.preferred_email == "secondary" and self.secondary_email:
             return self.secondary_email
         return self.email or self.secondary_email
 
+    def can_receive_emails(self):
+        """Check whether emails can be sent to this patient."""
+        return bool(
+            self.email_notifications_enabled
+            and not self.email_bounced
+            and self.get_preferred_email()
+        )
+
     def send_email(
         self,
         subject,
@@ -93,6 +265,9 @@ class PatientEmail(RitikoModel):
         template_name=None,
         context=None,
         from_email=None,
+        flush=True,
+        fail_silently=True,
+        email_template=None,
     ):
         """
         Send an email to this patient.
@@ -104,29 +279,38 @@ class PatientEmail(RitikoModel):
             template_name (str): Template name to render (optional)
             context (dict): Template context (optional)
             from_email (str): Sender email (optional)
+            flush (bool): Save last_email_sent right away; pass False when
+                sending in bulk and record the sends with mark_sent() instead
+            fail_silently (bool): Return False on errors instead of raising
+            email_template (EmailTemplate): Stored template to render instead
+                of template_name (optional)
 
         Returns:
             bool: True if email was sent successfully, False otherwise
         """
-        if not self.email_notifications_enabled:
-            return False
-
-        if self.email_bounced:
+        if not self.can_receive_emails():
             return False
 
         email_address = self.get_preferred_email()
-        if not email_address:
-            return False
 
         try:
+            if email_template is not None:
+                context = {} if context is None else context
+                context["patient"] = self.patient
+                context["email_profile"] = self
+
+                html_message, text_message = email_template.render(context)
+                if not message:
+                    message = text_message
+
             # If template_name is provided, render the email content
-            if template_name and context is not None:
+            elif template_name and context is not None:
                 # Add patient to context
                 context["patient"] = self.patient
                 context["email_profile"] = self
 
                 # Render HTML message
-                html_message = render_to_string(template_name, context)
+                html_message = get_template(template_name).render(context)
 
                 # Create plain text message from HTML if not provided
                 if not message:
@@ -144,18 +328,91 @@ class PatientEmail(RitikoModel):
 
             if result:
                 # Update last email sent timestamp
-                from django.utils import timezone
-
                 self.last_email_sent = timezone.now()
-                self.save(update_fields=["last_email_sent"])
+                if flush:
+                    self.save(update_fields=["last_email_sent", "last_update"])
 
             return bool(result)
 
-        except Exception as e:
-            print(f"Failed to send email to patient {self.patient.pk}: {e}")
+        except Exception:
+            if not fail_silently:
+                raise
+            logger.exception("Failed to send email to patient %s", self.patient_id)
             return False
 
-    def send_appointment_reminder(self, appointment_date, appointment_time=None):
+    @classmethod
+    def send_bulk(cls, messages, from_email=None):
+        """
+        Send emails to many patients over a single mail connection.
+
+        Profiles that cannot receive emails (notifications disabled, bounced or
+        no address) are skipped, and last_email_sent is updated for all
+        successful sends with a single query.
+
+        Args:
+            messages (iterable): (email_profile, subject, message, html_message)
+                tuples; html_message may be None
+            from_email (str): Sender email (optional)
+
+        Returns:
+            int: Number of emails sent successfully
+        """
+        sent_pks = []
+
+        with get_connection() as mail_connection:
+            for email_profile, subject, message, html_message in messages:
+                if not email_profile.can_receive_emails():
+                    continue
+                email_address = email_profile.get_preferred_email()
+
+                if not message and html_message:
+                    message = strip_tags(html_message)
+
+                email = EmailMultiAlternatives(
+                    subject,
+                    message or "",
+                    from_email,
+                    [email_address],
+                    connection=mail_connection,
+                )
+                if html_message:
+                    email.attach_alternative(html_message, "text/html")
+
+                try:
+                    if mail_connection.send_messages([email]):
+                        sent_pks.append(email_profile.pk)
+                except Exception:
+                    logger.exception(
+                        "Failed to send email to patient %s", email_profile.patient_id
+                    )
+
+        cls.mark_sent(sent_pks)
+        return len(sent_pks)
+
+    @classmethod
+    def mark_sent(cls, pks, when=None):
+        """
+        Record that emails were sent to the given profiles with a single query.
+
+        Args:
+            pks (iterable): Primary keys of the email profiles
+            when (datetime): Time the emails were sent (defaults to now)
+
+        Returns:
+            int: Number of profiles updated
+        """
+        pks = list(pks)
+        if not pks:
+            return 0
+
+        now = timezone.now()
+        return cls.objects.filter(pk__in=pks).update(
+            last_email_sent=when or now, last_update=now
+        )
+
+    def send_appointment_reminder(
+        self, appointment_date, appointment_time=None, fail_silently=True
+    ):
         """Send appointment reminder email."""
         context = {
             "appointment_date": appointment_date,
@@ -166,17 +423,19 @@ class PatientEmail(RitikoModel):
             subject="Appointment Reminder",
             template_name="patient_email_plugin/emails/appointment_reminder.html",
             context=context,
+            fail_silently=fail_silently,
         )
 
-    def send_welcome_email(self):
+    def send_welcome_email(self, fail_silently=True):
         """Send welcome email to new patient."""
         return self.send_email(
             subject="Welcome to our healthcare system",
             template_name="patient_email_plugin/emails/welcome.html",
             context={},
+            fail_silently=fail_silently,
         )
 
-    def send_care_plan_update(self, care_plan_details):
+    def send_care_plan_update(self, care_plan_details, fail_silently=True):
         """Send care plan update notification."""
         context = {
             "care_plan_details": care_plan_details,
@@ -186,6 +445,7 @@ class PatientEmail(RitikoModel):
             subject="Care Plan Update",
             template_name="patient_email_plugin/emails/care_plan_update.html",
             context=context,
+            fail_silently=fail_silently,
         )
 
 
@@ -227,3 +487,26 @@ class EmailTemplate(RitikoModel):
 
     def __str__(self):
         return self.name
+
+    def render(self, context):
+        """
+        Render this template's content.
+
+        When no text_content was entered, the plain text version is rendered
+        from the tag-stripped HTML source, which is prepared once per source.
+
+        Args:
+            context (dict): Template context
+
+        Returns:
+            tuple: (html_content, text_content) rendered strings
+        """
+        html_content = compile_template_source(self.html_content).render(
+            Context(context)
+        )
+        if self.text_content:
+            text_template = compile_template_source(self.text_content)
+        else:
+            text_template = compile_text_template_source(self.html_content)
+        text_content = text_template.render(Context(context, autoescape=False))
+        return html_content, text_content
@@ -0,0 +1,8 @@
+"""
+Patient Email Plugin Permissions
+
+Permission names used by the plugin.
+"""
+
+MANAGE_PATIENT_EMAILS = "patient_email_plugin.can_manage_patient_emails"
+SEND_PATIENT_EMAILS = "patient_email_plugin.can_send_patient_emails"
@@ -57,6 +57,7 @@ setup(
     include_package_data=True,
     install_requires=[
         "Django>=3.2,<5.0",
+        "celery>=5.0",
     ],
     extras_require={
         "dev": [
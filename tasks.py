@@ -0,0 +1,83 @@
+"""
+Patient Email Plugin Tasks
+
+Celery tasks that send patient emails outside the request/response cycle.
+"""
+import smtplib
+
+from celery import shared_task
+
+from patients.models.people import Patient
+
+# Retry transient mail server failures with exponential backoff
+RETRY_OPTIONS = {
+    "autoretry_for": (smtplib.SMTPException, ConnectionError),
+    "retry_backoff": True,
+    "max_retries": 5,
+}
+
+
+def _get_patient(patient_id):
+    """Get a patient with its email profile joined, or None if it was deleted."""
+    return (
+        Patient.objects.select_related("email_profile").filter(pk=patient_id).first()
+    )
+
+
+@shared_task(**RETRY_OPTIONS)
+def send_patient_email_task(
+    patient_id,
+    subject,
+    message=None,
+    html_message=None,
+    template_name=None,
+    context=None,
+):
+    """
+    Send an email to a patient.
+
+    Args:
+        patient_id (int): Patient primary key
+        subject (str): Email subject
+        message (str): Plain text message (optional if template_name provided)
+        html_message (str): HTML message (optional)
+        template_name (str): Template name to render (optional)
+        context (dict): Template context (optional)
+
+    Returns:
+        bool: True if email was sent successfully, False otherwise
+    """
+    patient = _get_patient(patient_id)
+    if patient is None:
+        return False
+
+    return patient.send_email(
+        subject=subject,
+        message=message,
+        html_message=html_message,
+        template_name=template_name,
+        context=context,
+        fail_silently=False,
+    )
+
+
+@shared_task(**RETRY_OPTIONS)
+def send_welcome_email_task(patient_id):
+    """Send the welcome email to a patient."""
+    patient = _get_patient(patient_id)
+    if patient is None:
+        return False
+
+    return patient.send_welcome_email(fail_silently=False)
+
+
+@shared_task(**RETRY_OPTIONS)
+def send_appointment_reminder_task(patient_id, appointment_date, appointment_time=None):
+    """Send an appointment reminder email to a patient."""
+    patient = _get_patient(patient_id)
+    if patient is None:
+        return False
+
+    return patient.send_appointment_reminder(
+        appointment_date, appointment_time, fail_silently=False
+    )
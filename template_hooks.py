@@ -2,13 +2,149 @@
 Template hooks for extending patient pages.
 
 This module provides template hooks that allow the patient email plugin
-to inject content into existing patient detail and edit pages.
+to inject content into existing patient detail and edit pages. It is imported
+from the app config's ready(), once models are loaded.
 """
-from django.template.loader import render_to_string
+import logging
+
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.template.loader import get_template
+from django.utils import timezone, translation
+
+from patients.models.people import Patient
+
+from .forms import PatientEmailForm
+from .models import PatientEmail, email_profile_is_loaded
+from .permissions import MANAGE_PATIENT_EMAILS
+
+logger = logging.getLogger(__name__)
+
+# How long rendered hook fragments stay cached, in seconds
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+DETAIL_SECTION_TEMPLATE = (
+    "patient_email_plugin/partials/patient_detail_email_section.html"
+)
+EDIT_SECTION_TEMPLATE = "patient_email_plugin/partials/patient_edit_email_section.html"
+SIDEBAR_WIDGET_TEMPLATE = (
+    "patient_email_plugin/partials/patient_detail_sidebar_email_widget.html"
+)
+
+# Template context variables holding the patients rendered on a list page
+PATIENT_LIST_CONTEXT_KEYS = ("patients", "object_list")
+
+
+def get_email_profiles_for_patients(request, patient_ids):
+    """
+    Get email profiles for the given patients, memoized on the request.
+
+    Profiles are loaded with a single query for every patient id that has not
+    been looked up yet during this request, so hooks rendered once per patient
+    (e.g. on list pages) don't issue one query each. Pages that render many
+    patients can warm the cache up front with all of their patient ids.
+
+    Args:
+        request: The current request
+        patient_ids: Iterable of patient primary keys
+
+    Returns:
+        dict: Mapping of patient id to PatientEmail (or None if not configured)
+    """
+    profiles = request.__dict__.setdefault("_patient_email_cache", {})
+    missing = {pid for pid in patient_ids if pid not in profiles}
+
+    if missing:
+        profiles.update(dict.fromkeys(missing))
+        # The hooks already have the patients, so skip the default joins
+        email_profiles = PatientEmail.objects.select_related(None).filter(
+            patient_id__in=missing
+        )
+        for email_profile in email_profiles:
+            profiles[email_profile.patient_id] = email_profile
+
+    return profiles
+
+
+def get_context_patients(context, patient):
+    """
+    Get the patients rendered by the page, including the given patient.
+
+    Patient lists are taken from PATIENT_LIST_CONTEXT_KEYS. Querysets are only
+    used once evaluated, so collecting them never runs the page's query early.
+    """
+    patients = [patient]
+    for key in PATIENT_LIST_CONTEXT_KEYS:
+        rendered = context.get(key)
+        if isinstance(rendered, QuerySet):
+            rendered = rendered._result_cache
+        if isinstance(rendered, (list, tuple)):
+            patients.extend(p for p in rendered if isinstance(p, Patient))
+    return patients
+
+
+def get_patient_email_profile(request, patient, context):
+    """
+    Get a patient's email profile, preferring one loaded with the patient.
+
+    Otherwise the profiles of every patient in the template context are
+    loaded in one query through get_email_profiles_for_patients(), so a list
+    page rendering a hook per patient only queries for the first one.
+    """
+    if email_profile_is_loaded(patient):
+        return getattr(patient, "email_profile", None)
+
+    patients = get_context_patients(context, patient)
+    profiles = get_email_profiles_for_patients(request, [p.pk for p in patients])
+    return profiles.get(patient.pk)
+
+
+def get_email_profile_version(email_profile):
+    """Return a token that changes whenever the email profile is saved."""
+    if email_profile is None or email_profile.last_update is None:
+        return 0
+    return email_profile.last_update.timestamp()
+
+
+def render_cached_fragment(name, key_parts, template_name, context, request):
+    """
+    Render a template fragment through the Django cache.
+
+    The active language and time zone are always part of the cache key, since
+    fragments format dates with them.
+
+    Args:
+        name (str): Fragment name, used as part of the cache key
+        key_parts (iterable): Values the rendered output depends on
+        template_name (str): Template to render on a cache miss
+        context (dict): Template context
+        request: The current request
+
+    Returns:
+        str: Rendered HTML
+    """
+    key_parts = [
+        *key_parts,
+        translation.get_language(),
+        timezone.get_current_timezone_name(),
+    ]
+    cache_key = ":".join(["pep", name, *(str(part) for part in key_parts)])
+    return cache.get_or_set(
+        cache_key,
+        lambda: get_template(template_name).render(context, request),
+        timeout=FRAGMENT_CACHE_TIMEOUT,
+    )
 
 
 class PatientTemplateHooks:
-    """Template hooks for patient pages."""
+    """
+    Template hooks for patient pages.
+
+    Email profiles are taken from the patient when loaded with
+    select_related()/prefetch_related("email_profile"), and otherwise loaded
+    in one query for all patients listed in the template context (see
+    PATIENT_LIST_CONTEXT_KEYS).
+    """
 
     @staticmethod
     def patient_detail_email_section(context, request):
@@ -24,14 +160,9 @@ class PatientTemplateHooks:
             return ""
 
         # Check if user has permission to view email information
-        has_permission = request.user.has_perm(
-            "patient_email_plugin.can_manage_patient_emails"
-        )
+        has_permission = request.user.has_perm(MANAGE_PATIENT_EMAILS)
 
-        try:
-            email_profile = patient.email_profile
-        except:
-            email_profile = None
+        email_profile = get_patient_email_profile(request, patient, context)
 
         hook_context = {
             "patient": patient,
@@ -40,10 +171,16 @@ class PatientTemplateHooks:
             "request": request,
         }
 
-        return render_to_string(
-            "patient_email_plugin/partials/patient_detail_email_section.html",
+        return render_cached_fragment(
+            "detail",
+            [
+                patient.pk,
+                get_email_profile_version(email_profile),
+                int(has_permission),
+            ],
+            DETAIL_SECTION_TEMPLATE,
             hook_context,
-            request=request,
+            request,
         )
 
     @staticmethod
@@ -60,23 +197,19 @@ class PatientTemplateHooks:
             return ""
 
         # Check if user has permission to manage email information
-        has_permission = request.user.has_perm(
-            "patient_email_plugin.can_manage_patient_emails"
-        )
+        has_permission = request.user.has_perm(MANAGE_PATIENT_EMAILS)
 
-        # Import here to avoid circular imports
-        from .forms import PatientEmailForm
-        from .models import PatientEmail
+        email_profile = get_patient_email_profile(request, patient, context)
 
-        # Get or create email profile
-        try:
-            email_profile, created = PatientEmail.objects.get_or_create(
-                patient=patient, defaults={"organization": request.user.organization}
+        # The form is only rendered for users who can manage email settings
+        form = None
+        if has_permission:
+            # Bind the form to an unsaved profile when none exists yet; it is
+            # only persisted once the form is submitted and saved.
+            form_instance = email_profile or PatientEmail(
+                patient=patient, organization=request.user.organization
             )
-        except:
-            email_profile = None
-
-        form = PatientEmailForm(instance=email_profile) if email_profile else None
+            form = PatientEmailForm(instance=form_instance)
 
         hook_context = {
             "patient": patient,
@@ -86,11 +219,7 @@ class PatientTemplateHooks:
             "request": request,
         }
 
-        return render_to_string(
-            "patient_email_plugin/partials/patient_edit_email_section.html",
-            hook_context,
-            request=request,
-        )
+        return get_template(EDIT_SECTION_TEMPLATE).render(hook_context, request)
 
     @staticmethod
     def patient_detail_sidebar_email_widget(context, request):
@@ -105,12 +234,8 @@ class PatientTemplateHooks:
         if not patient:
             return ""
 
-        try:
-            email_profile = patient.email_profile
-            has_email = bool(email_profile and email_profile.get_preferred_email())
-        except:
-            email_profile = None
-            has_email = False
+        email_profile = get_patient_email_profile(request, patient, context)
+        has_email = bool(email_profile and email_profile.get_preferred_email())
 
         hook_context = {
             "patient": patient,
@@ -119,10 +244,12 @@ class PatientTemplateHooks:
             "request": request,
         }
 
-        return render_to_string(
-            "patient_email_plugin/partials/patient_detail_sidebar_email_widget.html",
+        return render_cached_fragment(
+            "sidebar",
+            [patient.pk, get_email_profile_version(email_profile)],
+            SIDEBAR_WIDGET_TEMPLATE,
             hook_context,
-            request=request,
+            request,
         )
 
 
@@ -156,11 +283,7 @@ def register_template_hooks():
             priority=5,
         )
 
-        print("📧 Patient email template hooks registered successfully")
+        logger.debug("Patient email template hooks registered successfully")
 
     except ImportError:
-        print("⚠️ Template hook registry not available, hooks not registered")
-
-
-# Auto-register hooks when module is imported
-register_template_hooks()
+        logger.warning("Template hook registry not available, hooks not registered")
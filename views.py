@@ -3,32 +3,147 @@ Patient Email Plugin Views
 
 Views for managing patient email functionality and extending existing patient views.
 """
+import json
+from itertools import islice
+
+from celery import group
 from django.contrib import messages
+from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_POST
 from django.views.generic import ListView, UpdateView
 
 from patients.models.people import Patient
 
 from .forms import PatientEmailForm, SendEmailForm
 from .models import PatientEmail
+from .permissions import MANAGE_PATIENT_EMAILS, SEND_PATIENT_EMAILS
+from .tasks import (
+    send_appointment_reminder_task,
+    send_patient_email_task,
+    send_welcome_email_task,
+)
+from .template_hooks import (
+    DETAIL_SECTION_TEMPLATE,
+    get_email_profile_version,
+    render_cached_fragment,
+)
+
+
+def _get_patient(request, patient_id, with_email=False):
+    """
+    Get a patient of the current user's organization, memoized on the request.
+
+    The organization is joined into the same query, and so is the reverse
+    email profile relation when ``with_email`` is set, so accessing them
+    afterwards doesn't hit the database.
+
+    Args:
+        request: The current request
+        patient_id: Primary key of the patient
+        with_email (bool): Whether to also load the patient's email profile
+
+    Returns:
+        Patient: The patient
+
+    Raises:
+        Http404: If the patient doesn't exist in the user's organization
+    """
+    patients = request.__dict__.setdefault("_pep_patient_cache", {})
+    key = (patient_id, with_email)
+    if key in patients:
+        return patients[key]
+
+    organization = getattr(request.user, "organization", None)
+    if organization is None:
+        raise Http404("No Patient matches the given query.")
+
+    queryset = Patient.objects.select_related("organization")
+    if with_email:
+        queryset = queryset.select_related("email_profile")
+    patient = queryset.filter(pk=patient_id, organization=organization).first()
+    if patient is None:
+        raise Http404("No Patient matches the given query.")
+
+    patients[key] = patient
+    return patient
+
+
+def _can_email(patient):
+    """Check whether emails can be sent to a patient loaded with its email profile."""
+    email_profile = getattr(patient, "email_profile", None)
+    return bool(email_profile and email_profile.can_receive_emails())
 
 
 class PatientEmailListView(PermissionRequiredMixin, ListView):
-    """List view for patient email profiles."""
+    """
+    List view for patient email profiles.
+
+    Pages through profiles newest first using the id of the last profile
+    shown (?cursor=<id>) instead of LIMIT/OFFSET, so deep pages are as cheap
+    as the first one and no COUNT(*) is needed.
+    """
 
     model = PatientEmail
     template_name = "patient_email_plugin/email_list.html"
     context_object_name = "email_profiles"
-    permission_required = "patient_email_plugin.can_manage_patient_emails"
-    paginate_by = 25
+    permission_required = MANAGE_PATIENT_EMAILS
+    page_size = 25
+    # Email profile columns shown in the list; everything else is deferred
+    list_fields = (
+        "patient",
+        "email",
+        "secondary_email",
+        "preferred_email",
+        "email_verified",
+        "email_notifications_enabled",
+        "email_bounced",
+        "last_email_sent",
+    )
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        # Anonymous users have no organization; dispatch() rejects them later
+        self._org = getattr(request.user, "organization", None)
+
+    def get_cursor(self):
+        """Get the id the current page starts after, if any."""
+        try:
+            return int(self.request.GET["cursor"])
+        except (KeyError, ValueError):
+            return None
 
     def get_queryset(self):
-        """Get email profiles for current organization."""
-        return PatientEmail.objects.filter(
-            organization=self.request.user.organization
-        ).select_related("patient")
+        """Get a page of email profiles for current organization."""
+        queryset = (
+            PatientEmail.objects.filter(organization=self._org)
+            .select_related(None)
+            .select_related("patient")
+            .only(*self.list_fields)
+            .order_by("-id")
+        )
+
+        cursor = self.get_cursor()
+        if cursor is not None:
+            queryset = queryset.filter(id__lt=cursor)
+
+        # Fetch one extra row to tell whether there is a next page
+        return queryset[: self.page_size + 1]
+
+    def get_context_data(self, **kwargs):
+        # Stream the page instead of caching the queryset, then peek at the
+        # extra row to tell whether there is a next page
+        rows = self.object_list.iterator(chunk_size=self.page_size + 1)
+        email_profiles = list(islice(rows, self.page_size))
+        has_next = any(True for _ in rows)
+
+        context = super().get_context_data(object_list=email_profiles, **kwargs)
+        context["has_next"] = has_next
+        context["next_cursor"] = email_profiles[-1].pk if has_next else None
+        return context
 
 
 class PatientEmailEditView(PermissionRequiredMixin, UpdateView):
@@ -37,18 +152,18 @@ class PatientEmailEditView(PermissionRequiredMixin, UpdateView):
     model = PatientEmail
     form_class = PatientEmailForm
     template_name = "patient_email_plugin/email_edit.html"
-    permission_required = "patient_email_plugin.can_manage_patient_emails"
+    permission_required = MANAGE_PATIENT_EMAILS
 
     def get_object(self):
         """Get or create email profile for the patient."""
         patient_id = self.kwargs.get("patient_id")
-        patient = get_object_or_404(
-            Patient, pk=patient_id, organization=self.request.user.organization
-        )
+        patient = _get_patient(self.request, patient_id, with_email=True)
 
-        email_profile, created = PatientEmail.objects.get_or_create(
-            patient=patient, defaults={"organization": self.request.user.organization}
-        )
+        email_profile = getattr(patient, "email_profile", None)
+        if email_profile is None:
+            email_profile = PatientEmail.get_or_create_fast(
+                patient.pk, patient.organization_id
+            )
         return email_profile
 
 
@@ -57,28 +172,25 @@ def patient_detail_email_section(request, patient_id):
     Render email section for patient detail page.
     This is a partial template that can be included in the main patient detail page.
     """
-    patient = get_object_or_404(
-        Patient, pk=patient_id, organization=request.user.organization
-    )
-
-    try:
-        email_profile = patient.email_profile
-    except PatientEmail.DoesNotExist:
-        email_profile = None
+    patient = _get_patient(request, patient_id, with_email=True)
+    email_profile = getattr(patient, "email_profile", None)
+    has_permission = request.user.has_perm(MANAGE_PATIENT_EMAILS)
 
     context = {
         "patient": patient,
         "email_profile": email_profile,
-        "has_email_permission": request.user.has_perm(
-            "patient_email_plugin.can_manage_patient_emails"
-        ),
+        "has_email_permission": has_permission,
     }
 
-    return render(
-        request,
-        "patient_email_plugin/partials/patient_detail_email_section.html",
+    # Shares cached fragments with the patient detail template hook
+    html = render_cached_fragment(
+        "detail",
+        [patient.pk, get_email_profile_version(email_profile), int(has_permission)],
+        DETAIL_SECTION_TEMPLATE,
         context,
+        request,
     )
+    return HttpResponse(html)
 
 
 def patient_edit_email_section(request, patient_id):
@@ -86,14 +198,14 @@ def patient_edit_email_section(request, patient_id):
     Render email section for patient edit page.
     This is a partial template that can be included in the main patient edit form.
     """
-    patient = get_object_or_404(
-        Patient, pk=patient_id, organization=request.user.organization
-    )
+    patient = _get_patient(request, patient_id, with_email=True)
 
     # Get or create email profile
-    email_profile, created = PatientEmail.objects.get_or_create(
-        patient=patient, defaults={"organization": request.user.organization}
-    )
+    email_profile = getattr(patient, "email_profile", None)
+    if email_profile is None:
+        email_profile = PatientEmail.get_or_create_fast(
+            patient.pk, patient.organization_id
+        )
 
     if request.method == "POST":
         form = PatientEmailForm(request.POST, instance=email_profile)
@@ -103,16 +215,16 @@ def patient_edit_email_section(request, patient_id):
             return JsonResponse({"success": True})
         else:
             return JsonResponse({"success": False, "errors": form.errors})
-    else:
-        form = PatientEmailForm(instance=email_profile)
+
+    # The form is only rendered for users who can manage email settings
+    has_permission = request.user.has_perm(MANAGE_PATIENT_EMAILS)
+    form = PatientEmailForm(instance=email_profile) if has_permission else None
 
     context = {
         "patient": patient,
         "email_profile": email_profile,
         "email_form": form,
-        "has_email_permission": request.user.has_perm(
-            "patient_email_plugin.can_manage_patient_emails"
-        ),
+        "has_email_permission": has_permission,
     }
 
     return render(
@@ -122,28 +234,23 @@ def patient_edit_email_section(request, patient_id):
     )
 
 
+@permission_required(SEND_PATIENT_EMAILS, raise_exception=True)
 def send_patient_email(request, patient_id):
     """Send email to a specific patient."""
-    patient = get_object_or_404(
-        Patient, pk=patient_id, organization=request.user.organization
-    )
-
-    if not request.user.has_perm("patient_email_plugin.can_send_patient_emails"):
-        messages.error(request, "You don't have permission to send emails to patients.")
-        return redirect("patients:detail", patient_id)
+    patient = _get_patient(request, patient_id, with_email=True)
 
     if request.method == "POST":
         form = SendEmailForm(request.POST)
         if form.is_valid():
-            success = patient.send_email(
-                subject=form.cleaned_data["subject"],
-                message=form.cleaned_data["message"],
-                html_message=form.cleaned_data.get("html_message"),
-            )
-
-            if success:
+            if _can_email(patient):
+                send_patient_email_task.delay(
+                    patient.pk,
+                    subject=form.cleaned_data["subject"],
+                    message=form.cleaned_data["message"],
+                    html_message=form.cleaned_data.get("html_message"),
+                )
                 messages.success(
-                    request, f"Email sent successfully to {patient.get_full_name()}"
+                    request, f"Email to {patient.get_full_name()} queued for delivery"
                 )
             else:
                 messages.error(
@@ -163,49 +270,131 @@ def send_patient_email(request, patient_id):
     return render(request, "patient_email_plugin/send_email.html", context)
 
 
-def ajax_patient_email_quick_actions(request, patient_id):
-    """AJAX endpoint for quick email actions from patient detail page."""
-    if not request.user.has_perm("patient_email_plugin.can_send_patient_emails"):
-        return JsonResponse({"success": False, "error": "Permission denied"})
-
-    patient = get_object_or_404(
-        Patient, pk=patient_id, organization=request.user.organization
-    )
-    action = request.POST.get("action")
-
-    success = False
-    message = "Unknown action"
-
-    if action == "send_welcome":
-        success = patient.send_welcome_email()
-        message = "Welcome email sent" if success else "Failed to send welcome email"
-
-    elif action == "send_appointment_reminder":
-        appointment_date = request.POST.get("appointment_date")
-        appointment_time = request.POST.get("appointment_time")
-        success = patient.send_appointment_reminder(appointment_date, appointment_time)
-        message = (
-            "Appointment reminder sent"
-            if success
-            else "Failed to send appointment reminder"
-        )
-
-    elif action == "verify_email":
-        # Logic to send email verification
-        success = patient.send_email(
+# Quick actions for ajax_patient_email_quick_actions(), mapping each action name
+# to a callable building its task signature from the patient and the request,
+# and the messages to return when the email is queued or can't be sent.
+ACTIONS = {
+    "send_welcome": (
+        lambda patient, request: send_welcome_email_task.s(patient.pk),
+        "Welcome email queued",
+        "Failed to send welcome email",
+    ),
+    "send_appointment_reminder": (
+        lambda patient, request: send_appointment_reminder_task.s(
+            patient.pk,
+            request.POST.get("appointment_date"),
+            request.POST.get("appointment_time"),
+        ),
+        "Appointment reminder queued",
+        "Failed to send appointment reminder",
+    ),
+    "verify_email": (
+        lambda patient, request: send_patient_email_task.s(
+            patient.pk,
             subject="Please verify your email address",
             template_name="patient_email_plugin/emails/verify_email.html",
             context={},
-        )
-        message = (
-            "Verification email sent"
-            if success
-            else "Failed to send verification email"
-        )
+        ),
+        "Verification email queued",
+        "Failed to send verification email",
+    ),
+}
+
+# Quick actions that are only queued once per patient within a time window,
+# mapping each action name to the window in seconds and the message returned
+# for repeats, so double clicks and retries don't send the same email twice.
+ACTION_DEDUPE = {
+    "send_welcome": (300, "Welcome email already sent recently"),
+    "verify_email": (60, "Verification email already sent recently"),
+}
+
+
+@require_POST
+def ajax_patient_email_quick_actions(request, patient_id):
+    """
+    AJAX endpoint for quick email actions from patient detail page.
 
+    Takes either a single ``action`` or a JSON list of them in ``actions``, so
+    a page can fire several actions with one request. The patient is loaded
+    once and the emails for all accepted actions are queued together.
+    """
+    user = request.user
+    if not user.has_perm(SEND_PATIENT_EMAILS):
+        return JsonResponse({"success": False, "error": "Permission denied"})
+
+    batch = "actions" in request.POST
+    if batch:
+        try:
+            actions = json.loads(request.POST["actions"])
+        except ValueError:
+            actions = None
+        if not isinstance(actions, list) or not all(
+            isinstance(action, str) for action in actions
+        ):
+            return JsonResponse(
+                {"success": False, "error": "Invalid actions"}, status=400
+            )
+    else:
+        actions = [request.POST.get("action")]
+
+    patient = _get_patient(request, patient_id, with_email=True)
+
+    # Emails are sent by background tasks; only check they can be delivered
+    can_email = _can_email(patient)
+    signatures = []
+    claimed_keys = []
+    results = []
+
+    for action in actions:
+        quick_action = ACTIONS.get(action)
+        if quick_action is None:
+            results.append(
+                {
+                    "action": action,
+                    "success": False,
+                    "queued": False,
+                    "message": "Unknown action",
+                }
+            )
+            continue
+
+        get_signature, ok_message, error_message = quick_action
+        result = {
+            "action": action,
+            "success": can_email,
+            "queued": False,
+            "message": ok_message if can_email else error_message,
+        }
+        if can_email:
+            dedupe = ACTION_DEDUPE.get(action)
+            dedupe_key = f"pep:{action}:{patient.pk}"
+            # cache.add() only sets the key if it is missing, in a single
+            # roundtrip, so repeated clicks within the TTL queue nothing
+            if dedupe and not cache.add(dedupe_key, 1, timeout=dedupe[0]):
+                result["message"] = dedupe[1]
+            else:
+                if dedupe:
+                    claimed_keys.append(dedupe_key)
+                signatures.append(get_signature(patient, request))
+                result["queued"] = True
+        results.append(result)
+
+    if signatures:
+        try:
+            group(signatures).apply_async()
+        except Exception:
+            # Nothing was queued, so don't block retries of these actions
+            cache.delete_many(claimed_keys)
+            raise
+
+    if batch:
+        return JsonResponse({"results": results})
+
+    result = results[0]
     return JsonResponse(
         {
-            "success": success,
-            "message": message,
+            "success": result["success"],
+            "queued": result["queued"],
+            "message": result["message"],
         }
     )